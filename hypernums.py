@@ -3,9 +3,18 @@
 # Compatible with python2 (or should be)
 from __future__ import division
 import math
+import operator
 import re
+import sys
 from sys import version_info
 from numbers import Number
+try:
+    from functools import lru_cache
+except ImportError:
+    # Python 2: no caching, then.
+    def lru_cache(maxsize=128):
+        "Stand-in for functools.lru_cache: leave the function alone."
+        return lambda f: f
 
 if version_info.major < 3:
     PY3 = False
@@ -15,6 +24,114 @@ else:
     PY3 = True
     BASESTR=str
 
+# The scalar float kernels below get compiled by numba if it's there.
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        "Stand-in for numba.njit: leave the function as plain Python."
+        return lambda f: f
+
+# Fast-math, except for assuming no NaNs or Infs: the kernels are
+# allowed to produce them.
+_FASTMATH={'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+_INVLOGTEN=1.0/math.log(10)
+
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _lambertw(z):
+    "Compute W function of float by Newton's method"
+    epsilon=1e-15
+    # Newton's method.  z is a float!
+    if z < -1/math.e:
+        return float('nan')     # No real W below the branch point.
+    if z < -0.32:
+        # Newton crawls near the branch point, so seed with the series
+        # for W there; right at it, that's all there is.
+        p=math.sqrt(max(0.0, 2*(math.e*z+1)))
+        w=-1+p*(1-p*(1/3.0-p*11/72.0))
+        if p < 1e-4:
+            return w
+    elif z<5:
+        w=math.log1p(z)         # Close enough to take ~6 steps at most.
+    else:
+        w=math.log(z)-math.log(math.log(z))
+    # Converges quadratically, so a handful of steps reaches full
+    # precision.  Bounded, so it can't hang on a bad z; NaN if it
+    # didn't converge in that many.
+    for _ in range(20):
+        dw=(w*math.exp(w)-z)/(math.exp(w)*(1+w))
+        w=w-dw
+        if abs(dw)<=epsilon*abs(w):
+            return w
+    return float('nan')
+
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _addlog(la,lb):
+    "Log of sum of antilog"
+    # log of sum of antilog:
+    # log10(a) + log10(1+10^(log10(b)-log10(a)))
+    # Being passed log10(a) and log10(b), a>b
+    # log1p keeps the precision when b is much smaller than a.
+    return la + math.log1p(math.pow(10.0,lb-la))*_INVLOGTEN
+
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _sublog(la,lb):
+    return la + math.log1p(-math.pow(10.0,lb-la))*_INVLOGTEN
+
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _gamma(n):
+    "gamma function of floating-point number"
+    # Math and method copied from hypercalc
+    if n < -50:
+        if n==int(n):
+            return float('inf')
+        return 0
+    acc=1
+    while n<10:
+        acc *= n
+        n += 1
+    n -= 1
+    l = 0.5*math.log(2*math.pi)
+    l += (n+0.5)*math.log(n)
+    l -= n
+    n2 = n*n
+    np = n
+    l += 1.0/(12.0*np)
+    np *= n2
+    l -= 1.0/(360.0*np)
+    np *= n2
+    l += 1.0/(1260.0*np)
+    np *= n2
+    l -= 1.0/(1680.0*np)
+    np *= n2
+    l += 1.0/(1188.0*np)
+    np *= n2
+    l -= 691.0/(360360.0*np)
+    np *= n2
+    l += 7.0/(1092.0*np)
+    np *= n2
+    l -= 3617.0/(122400.0*np)
+    rv=math.exp(l)/acc
+    #if abs(rv-int(rv))<1e-5: # nice to round if really close.
+    #    return math.floor(rv+0.5)
+    #else:
+    #    return rv
+    return rv
+
+
+@lru_cache(maxsize=256)
+def _gamma_cached(n):
+    "_gamma(n), remembered.  Exact for positive integers up to 170."
+    if 0 < n < 171 and n == int(n):
+        return float(math.factorial(int(n)-1))
+    return _gamma(n)
+
+
 class Hypernum:
     """
     Hypernum class, after Robert Munafo's Hypercalc program.
@@ -23,20 +140,32 @@ class Hypernum:
     methods, and log10(), ln(), exp(), pow10(), sqrt(), etc.
     """
 
-    # As written, you have to write 0.5, not .5.
-    hypre='(?P<pt>\\d+[pP])?(?P<sign>[+-])?(?P<int>\\d+)(?P<frac>\\.\\d*)?(?:[eE⏨](?P<exp>[+-]?\\d+))?'
-    if not PY3:
-        hypre=hypre.decode('utf8')
-    hypre_compiled=re.compile(hypre)
+    # No per-instance __dict__: we make lots of these.  _sign caches
+    # sign(); anything that changes the mantissa's sign without calling
+    # normalize() has to update it too.
+    __slots__=('pt', 'mantissa', 'expon', '_sign')
+
+    # As written, you have to write 0.5, not .5.  A ⏨ for the exponent
+    # gets replaced by an 'e' before matching, so this can stay ASCII.
+    hypre='(?P<pt>\\d+[pP])?(?P<sign>[+-])?(?P<int>\\d+)(?P<frac>\\.\\d*)?(?:[eE](?P<exp>[+-]?\\d+))?'
+    hypre_compiled=re.compile(hypre, getattr(re, 'ASCII', 0))
+    exp_ten=u'⏨'
     cutoff=300
     overflow=1e300
     scale=14
     logten=math.log(10)
+    invlogten=_INVLOGTEN
+    logten_over_cutoff=logten/cutoff
+    log10e=math.log10(math.e)
+    log10log10e=math.log10(log10e)
     latex_pt_limit=3
     latex_exp_limit=0
     str_pt_limit=6
     str_exp_limit=16
     str_p1_exp_limit=11
+    # Powers of ten from 1e-324 to 1e308 (all a float can hold), for
+    # integer exponents.  Index with k+324; quicker than calling pow().
+    _POW10=[10.0**i for i in range(-324, 309)]
 
     def __init__(self, arg=None, **kwargs):
         """
@@ -60,58 +189,74 @@ class Hypernum:
         self.pt=0
         self.mantissa=0
         self.expon=0
-        try:
-            # For overflow errors from huge long ints.
-            zz=float(arg)
-        except OverflowError:
-            arg=str(arg)
-        except (TypeError, AttributeError, ValueError):
-            # If it's a dict, etc.
-            pass
         if arg is None:         # arg takes precedence, though.
             arg=kwargs
-        if isinstance(arg, dict):
+        # Check the common types by identity first; it's much cheaper
+        # than the isinstance() chain below.
+        t=type(arg)
+        if t is self.__class__:
+            # Already normalized, just copy it.
+            self.pt=arg.pt
+            self.mantissa=arg.mantissa
+            self.expon=arg.expon
+            self._sign=arg._sign
+            return
+        if t is float or t is int:
+            if t is int and arg.bit_length() > 1000:
+                # Long int too large to convert to float
+                self._from_string(str(arg))
+            else:
+                self.mantissa=arg
+        elif isinstance(arg, dict):
             if 'pt' in arg and 'mantissa' in arg and 'exp' in arg:
                 self.pt=arg['pt']
                 self.mantissa=arg['mantissa']
                 self.expon=arg['exp']
             else:
                 raise ValueError()
-        elif isinstance(arg, float) or isinstance(arg, int):
-            self.pt=0
-            self.mantissa=arg
-            self.expon=0
+        elif isinstance(arg, BASESTR):
+            self._from_string(arg)
         elif isinstance(arg, self.__class__):
             self.pt=arg.pt
             self.mantissa=arg.mantissa
             self.expon=arg.expon
-        elif isinstance(arg,BASESTR):
-            if arg == 'Inf':
-                self.mantissa=float('Inf')
-            elif arg == '-Inf':
-                self.mantissa=float('-Inf')
-            elif arg == 'NaN':
-                self.mantissa=float('NaN')
-            else:
-                match=self.hypre_compiled.match(arg)
-                assert match
-                if match.group('pt'):
-                    self.pt=int(match.group('pt')[:-1])
-                else:
-                    self.pt=0
-                try:
-                    self.mantissa=int(match.group('int') or 0)+float(match.group('frac') or 0)
-                    self.expon=0
-                except OverflowError:
-                    # Long int too large to convert to float
-                    # Have to do it ourselves.
-                    self.mantissa=float(match.group('int')[:10])
-                    self.expon=len(match.group('int'))-10
-                self.expon+=int(match.group('exp') or 0)
-                self.mantissa *= -1 if match.group('sign')=='-' else 1
-                # Uncertainty?
+        elif isinstance(arg, Number):
+            # Longs, bools, numpy floats, Fractions...
+            try:
+                self.mantissa=float(arg)
+            except OverflowError:
+                self._from_string(str(arg))
         self.normalize()
 
+    def _from_string(self, arg):
+        "Fill in pt, mantissa and expon from a string; see __init__."
+        if arg == 'Inf':
+            self.mantissa=float('Inf')
+            return
+        elif arg == '-Inf':
+            self.mantissa=float('-Inf')
+            return
+        elif arg == 'NaN':
+            self.mantissa=float('NaN')
+            return
+        match=self.hypre_compiled.match(arg.replace(self.exp_ten, 'e'))
+        assert match
+        if match.group('pt'):
+            self.pt=int(match.group('pt')[:-1])
+        else:
+            self.pt=0
+        try:
+            self.mantissa=int(match.group('int') or 0)+float(match.group('frac') or 0)
+            self.expon=0
+        except OverflowError:
+            # Long int too large to convert to float
+            # Have to do it ourselves.
+            self.mantissa=float(match.group('int')[:10])
+            self.expon=len(match.group('int'))-10
+        self.expon+=int(match.group('exp') or 0)
+        self.mantissa *= -1 if match.group('sign')=='-' else 1
+        # Uncertainty?
+
     def normalize(self):
         """Normalize hypernum into canonical form, viz.:
 
@@ -123,31 +268,44 @@ class Hypernum:
         """
         assert self.pt==int(self.pt)
         assert self.pt>=0
+        sign=self._sign= -1 if self.mantissa < 0 else 1 # NaN gets 1.
         if self.isinf() or self.isnan():
             return
         digits=0
-        sign= -1 if self.mantissa < 0 else 1
         self.mantissa *= sign
         if self.mantissa>0:
             digits=int(math.floor(math.log10(self.mantissa)))
         if digits != 0:         # Unnecessary test.
             self.expon += digits
-            self.mantissa *= pow(10, -digits)
+            self.mantissa *= self._p10(-digits)
         assert self.expon == int(self.expon)
 
-        while self.expon > self.cutoff: # while?? Seriously??
+        if self.expon > self.cutoff:
+            # Promote.  The new top, expon+log10(mantissa), has an expon
+            # of only a few digits...
             self.mantissa=self.expon + math.log10(self.mantissa)
-            digits=math.floor(math.log10(self.mantissa))
-            self.expon = int(digits)
-            self.mantissa *= pow(10, -digits)
+            digits=int(math.floor(math.log10(self.mantissa)))
+            if digits > self.cutoff:
+                # ...unless expon was itself beyond 10^300, as from a
+                # huge literal.  One more step always brings it down.
+                self.mantissa=digits + math.log10(self.mantissa *
+                                                  self._POW10[324-digits])
+                digits=int(math.floor(math.log10(self.mantissa)))
+                self.pt += 1
+            self.expon = digits
+            self.mantissa *= self._POW10[324-digits]
             self.pt += 1
-        # May have to demote
-        while self.float() <= self.cutoff and self.pt > 0:
-            self.mantissa=pow(10,self.float())
-            digits=math.floor(math.log10(self.mantissa))
-            self.expon=int(digits)
-            self.mantissa *= pow(10, -digits)
-            self.pt -= 1
+        # May have to demote.  At most a few steps: the worst case is a
+        # top of 0, which goes to 1, 10, 1e10.
+        if self.pt > 0:
+            top=self.mantissa*self._p10(self.expon)
+            if top <= self.cutoff:
+                while top <= self.cutoff and self.pt > 0:
+                    top=math.pow(10.0, top)
+                    self.pt -= 1
+                digits=int(math.floor(math.log10(top)))
+                self.expon=digits
+                self.mantissa=top*self._POW10[324-digits]
         self.mantissa *= sign
         # Uncomment if you need to test?
         # assert 1 <= self.mantissa < 10 or self.mantissa==0
@@ -157,20 +315,7 @@ class Hypernum:
         # assert self.pt >= 0
         # assert abs(self.mantissa*pow(10,self.expon)) > self.cutoff or self.pt==0
 
-    @staticmethod
-    def _lambertw(z):
-        "Compute W function of float by Newton's method"
-        epsilon=1e-14
-        # Newton's method.  z is a float!
-        if z<5:
-            w=0
-        else:
-            w=math.log(z)-math.log(math.log(z))
-        lastw=-1000
-        while abs(lastw-w)>epsilon:
-            lastw=w
-            w=w-(w*math.exp(w)-z)/(math.exp(w)*(1+w))
-        return w
+    _lambertw=staticmethod(_lambertw)
 
     def isnan(self):
         "True if hypernum is NaN"
@@ -220,7 +365,7 @@ class Hypernum:
         if self.pt < 1:
             if self.expon < 16:
                 return (self.__class__.__name__+
-                        "({0!r})".format(self.mantissa * pow(10, self.expon)))
+                        "({0!r})".format(self.mantissa * self._p10(self.expon)))
             return (self.__class__.__name__+
                     "({0!r}e+{1:d})".format(self.mantissa, self.expon))
         if self < 0:
@@ -228,9 +373,9 @@ class Hypernum:
         else:
             s=''
         if self.pt == 1 and self.expon < 11:
-            m=abs(self.mantissa) * pow(10, self.expon)
+            m=abs(self.mantissa) * self._p10(self.expon)
             d=int(math.floor(m)) # int makes it python2-compatible
-            m=pow(10, m - d)
+            m=math.pow(10.0, m - d)
             return self.__class__.__name__+"('{0:s}{1!r}e+{2:d}')".format(s, m, d)
         return "{x.__class__.__name__}('{x.pt:d}p{x.mantissa!r}e{x.expon:d}')".format(x=self)
 
@@ -242,24 +387,26 @@ class Hypernum:
             return "Inf"
         if self.isminf():
             return "-Inf"
-        s='-' if self.mantissa<0 else ''
         if pt is None:
-            pt=self.pt
-        else:
-            s=''                # No negatives in recursive call.
-        # Format self AS IF self.pt were pt.
+            return self._str(self.pt, '-' if self.mantissa<0 else '')
+        return self._str(pt)
+
+    def _str(self, pt, s=''):
+        """Format self AS IF self.pt were pt, for __str__, with s for the
+        sign.  Assumes self is finite: __str__ has already checked."""
         if pt < 1:
             if self.expon < self.str_exp_limit:
-                rv= "{0:.1f}".format(self.mantissa * pow(10, self.expon))
+                rv= "{0:.1f}".format(self.mantissa * self._p10(self.expon))
             else:
                 rv="{0:g} * 10^{1:d}".format(self.mantissa, self.expon)
         elif pt == 1 and self.expon < self.str_p1_exp_limit:
-            m=abs(self.mantissa) * pow(10, self.expon)
+            m=abs(self.mantissa) * self._p10(self.expon)
             d=int(math.floor(m))
-            m=pow(10, m - d)
+            m=math.pow(10.0, m - d)
             rv= "{0:s}{1:g} * 10^{2:d}".format(s, m, d)
         elif pt < self.str_pt_limit:
-            rv= "{0:s}10^({1:s})".format(s,self.__str__(pt-1))
+            # No negatives in recursive call.
+            rv= "{0:s}10^({1:s})".format(s,self._str(pt-1))
         else:
             rv="{0:s}{1:d} PT {2:f}e{3:d}".format(s, pt, abs(self.mantissa), self.expon)
         return rv
@@ -286,72 +433,60 @@ class Hypernum:
             return '$\\infty$'
         if self.isminf():
             return '$-\\infty$'
-        s='-' if self.mantissa<0 else ''
         if pt is None:
-            pt=self.pt
-            outermost=True
-        else:
-            s=''
-            outermost=False
+            return "$"+self._latex(self.pt, '-' if self.mantissa<0 else '')+"$"
+        return self._latex(pt)
+
+    def _latex(self, pt, s=''):
+        """LaTeX for self AS IF self.pt were pt, without the $s, for
+        _repr_latex_.  Assumes self is finite."""
         if pt<1:
             if self.expon<self.str_exp_limit:
-                rv= "{0:.1f}".format(self.mantissa * pow(10, self.expon))
+                rv= "{0:.1f}".format(self.mantissa * self._p10(self.expon))
             else:
                 rv= self._latex_scinote(self.mantissa, self.expon)
         elif pt == 1 and self.expon < self.str_p1_exp_limit:
-            m=abs(self.mantissa) * pow(10, self.expon)
+            m=abs(self.mantissa) * self._p10(self.expon)
             d=int(math.floor(m))
-            m=pow(10, m - d)
+            m=math.pow(10.0, m - d)
             rv=self._latex_scinote(self.sign()*m, d)
         elif pt < self.latex_pt_limit:
-            rv="{0:s}10^{{{1:s}}}".format(s,self._repr_latex_(pt-1))
+            rv="{0:s}10^{{{1:s}}}".format(s,self._latex(pt-1))
         else:
             rv= "{0:s}{1:d} {{\\rm \\ PT\\ }} ".format(s, pt) + self._latex_scinote(abs(self.mantissa), self.expon)
-        if outermost:
-            return "$"+rv+"$"
-        else:
-            return rv
+        return rv
 
 
     def sign(self):
         "Sign of mantissa.  Zero is considered positive."
-        return -1 if self.mantissa < 0 else 1 # No zero.
+        return self._sign # No zero.
+
+    def _key(self):
+        """Sort key: keys compare in the same order as the hypernums.
+
+        NaN has no place in the order (its key is the same as zero's), so
+        callers have to check for it first."""
+        m=self.mantissa
+        if m > 0:
+            if math.isinf(m):
+                return (2,)
+            return (1, self.pt, self.expon, m)
+        if m < 0:
+            if math.isinf(m):
+                return (-2,)
+            # Bigger PT or expon means *smaller* for negatives.
+            return (-1, -self.pt, -self.expon, m)
+        # Zero gets its own slot: comparing its expon of 0 against a
+        # small number's negative expon would give the wrong answer.
+        return (0,)
 
     def __gt__(self, other):
         "x.__gt__(y) <==> x > y"
-        if self.isminf():
-            return False
         if not isinstance(other, self.__class__):
             other=self.__class__(other)
         if self.isnan() or other.isnan():
             return False
-        if self.ispinf():
-            return not other.ispinf()
-        if other.isminf():
-            return True
-        if self.sign() != other.sign():
-            if self.sign() > 0:
-                return True
-            else:
-                return False
-        if self.sign() < 0:
-            reverse=True
-        else:
-            reverse=False
-        if self.pt > other.pt:
-            return True ^ reverse
-        elif self.pt < other.pt:
-            return False ^ reverse
-        # Special case!  If one has a negative expon and the other
-        # is *ZERO*, which has an expon of 0, comparing the expons
-        # gives the wrong answer!
-        if not (self.mantissa and other.mantissa):
-            return bool(self.mantissa) ^ reverse
-        if self.expon > other.expon:
-            return True ^ reverse
-        elif self.expon < other.expon:
-            return False ^ reverse
-        return (self.mantissa > other.mantissa)
+        return self._key() > other._key()
 
     def __eq__(self, other):
         "x.__eq__(y) <==> x==y"
@@ -359,26 +494,31 @@ class Hypernum:
             other=self.__class__(other)
         if self.isnan() or other.isnan():
             return False
-        if self.ispinf():
-            return other.ispinf()
-        if self.isminf():
-            return other.isminf()
-        return (self.pt == other.pt and self.expon == other.expon and
-                self.mantissa == other.mantissa)
+        return self._key() == other._key()
 
     def __ge__(self, other):
         "x.__ge__(y) <==> x >= y"
-        return self > other or self == other
+        if not isinstance(other, self.__class__):
+            other=self.__class__(other)
+        if self.isnan() or other.isnan():
+            return False
+        return self._key() >= other._key()
 
     def __lt__(self, other):
         "x.__lt__(y) <==> x < y"
         if not isinstance(other, self.__class__):
             other=self.__class__(other)
-        return other > self
+        if self.isnan() or other.isnan():
+            return False
+        return self._key() < other._key()
 
     def __le__(self, other):
         "x.__le__(y) <==> x <= y"
-        return self < other or self == other
+        if not isinstance(other, self.__class__):
+            other=self.__class__(other)
+        if self.isnan() or other.isnan():
+            return False
+        return self._key() <= other._key()
 
     def __ne__(self, other):
         "x.__ne__(y) <==> x != y"
@@ -388,6 +528,7 @@ class Hypernum:
         "Return copy of hypernum with sign set positive."
         rv=self.__class__(self)
         rv.mantissa=abs(rv.mantissa)
+        rv._sign=1
         return rv
 
     @classmethod
@@ -421,62 +562,72 @@ class Hypernum:
         else:
             return other, one
 
+    @staticmethod
+    def _inorder_fast(one, other):
+        """_inorder() for arguments that are already hypernums.
+
+        Same ordering, but looks at each sign once and compares keys
+        directly."""
+        m1=one.mantissa
+        m2=other.mantissa
+        neg=m1 < 0
+        if neg != (m2 < 0):
+            return (other, one) if neg else (one, other)
+        if m1 != m1 or m2 != m2:
+            return other, one   # NaN; what _inorder() does.
+        if neg:
+            return (one, other) if one._key() < other._key() else (other, one)
+        return (one, other) if one._key() > other._key() else (other, one)
+
+    def _swamping(self, other):
+        """Return whichever of self and other has the bigger PT, if that
+        PT is at least 2 and the other's is lower; otherwise None.
+
+        At that distance the smaller one is rounding noise in a sum or a
+        product.  None as well if the smaller one is NaN or infinite,
+        since then it's the one that matters."""
+        if self.pt == other.pt or (self.pt < 2 and other.pt < 2):
+            return None
+        if self.pt > other.pt:
+            big, small = self, other
+        else:
+            big, small = other, self
+        if small.isinf() or small.isnan():
+            return None
+        return big
+
+    @classmethod
+    def _p10(cls, k):
+        "10**k for integer k, from the table when possible."
+        if -324 <= k <= 308:
+            return cls._POW10[k+324]
+        return math.pow(10.0, k)
+
     def float(self):
         "Floating-point part of hypernum; power-tower considered to be zero."
         # Ignore pt!
-        return self.mantissa*pow(10,self.expon)
+        return self.mantissa*self._p10(self.expon)
 
-    @staticmethod
-    def _addlog(la,lb):
-        "Log of sum of antilog"
-        # log of sum of antilog:
-        # log10(a) + log10(1+10^(log10(b)-log10(a)))
-        # Being passed log10(a) and log10(b), a>b
-        return la + math.log10(1+pow(10,lb-la))
+    @classmethod
+    def _make(cls, pt, mantissa):
+        """Build a hypernum straight from a PT and a top float (expon 0),
+        skipping the argument checks in __init__."""
+        rv=cls.__new__(cls)
+        rv.pt=pt
+        rv.mantissa=mantissa
+        rv.expon=0
+        rv.normalize()
+        return rv
 
-    @staticmethod
-    def _sublog(la,lb):
-        return la + math.log10(1-pow(10,lb-la))
+    def _log10abs(self):
+        """log10(abs(x.float())), without computing the float.  Only
+        meaningful for pt==0."""
+        assert self.pt==0
+        return math.log10(abs(self.mantissa))+self.expon
 
-    @staticmethod
-    def _gamma(n):
-        "gamma function of floating-point number"
-        # Math and method copied from hypercalc
-        if n < -50:
-            if n==int(n):
-                return float('inf')
-            return 0
-        acc=1
-        while n<10:
-            acc *= n
-            n += 1
-        n -= 1
-        l = 0.5*math.log(2*math.pi)
-        l += (n+0.5)*math.log(n)
-        l -= n
-        n2 = n*n
-        np = n
-        l += 1.0/(12.0*np)
-        np *= n2
-        l -= 1.0/(360.0*np)
-        np *= n2
-        l += 1.0/(1260.0*np)
-        np *= n2
-        l -= 1.0/(1680.0*np)
-        np *= n2
-        l += 1.0/(1188.0*np)
-        np *= n2
-        l -= 691.0/(360360.0*np)
-        np *= n2
-        l += 7.0/(1092.0*np)
-        np *= n2
-        l -= 3617.0/(122400.0*np)
-        rv=math.exp(l)/acc
-        #if abs(rv-int(rv))<1e-5: # nice to round if really close.
-        #    return math.floor(rv+0.5)
-        #else:
-        #    return rv
-        return rv
+    _addlog=staticmethod(_addlog)
+    _sublog=staticmethod(_sublog)
+    _gamma=staticmethod(_gamma_cached)
 
     def gamma(self):
         "Gamma function"
@@ -550,9 +701,14 @@ class Hypernum:
 
     def __add__(self, other):
         "x.__add__(y) <==> x+y"
-        if (self>0) != (other>0):
+        if not isinstance(other, self.__class__):
+            other=self.__class__(other)
+        big=self._swamping(other)
+        if big is not None:
+            return self.__class__(big)
+        if (self.mantissa>0) != (other.mantissa>0):
             return self.__sub__(-other)
-        x, y=self._inorder(self,other)
+        x, y=self._inorder_fast(self,other)
         sign=x.sign()
         if x.ispinf():
             return self.Inf
@@ -563,41 +719,49 @@ class Hypernum:
         if x.pt==0:
             return self.__class__(x.float()+y.float())
         elif x.pt==1:
-            if y.pt==0:
-                val=sign*self._addlog(abs(x.float()), math.log10(abs(y.float())))
-            else:
-                val=sign*self._addlog(abs(x.float()), abs(y.float()))
-            return self.__class__({'pt':1, 'exp':0, 'mantissa':val})
+            la=abs(x.float())
+            lb=y._log10abs() if y.pt==0 else abs(y.float())
+            # _addlog(la, lb), inlined: this is the hot path.
+            val=sign*(la + math.log1p(math.pow(10.0, lb-la))*self.invlogten)
+            return self._make(1, val)
         else:
             return self.__class__(x)
 
     def __sub__(self, other):
         "x.__sub__(y) <==> x-y"
-        if (self>0) != (other>0):
+        if not isinstance(other, self.__class__):
+            other=self.__class__(other)
+        big=self._swamping(other)
+        if big is self:
+            return self.__class__(self)
+        elif big is not None:
+            return -other
+        if (self.mantissa>0) != (other.mantissa>0):
             return self.__add__(-other)
-        x, y=self._inorder(self,other)
+        x, y=self._inorder_fast(self,other)
         if self is x:
             sign = self.sign()
             slf,oth = x,y
         else:
             sign = -self.sign();
             slf,oth = y,x
-        if x.ispinf():
-            return self.Inf
+        if x.isinf():
+            if y.isinf():
+                return self.NaN  # Inf-Inf
+            # The infinite one wins, with its sign from the subtraction.
+            return self.Inf if sign > 0 else self.mInf
         if x.isnan():
             return self.NaN
-        if x.isminf():
-            return self.mInf
         if x.pt==0:
             return self.__class__(slf.float()-oth.float())
         if x==y:
             return self.Zero    # avoid exceptions farther along.
         elif x.pt==1:
-            if y.pt==0:
-                val=sign*self._sublog(abs(x.float()), math.log10(abs(y.float())))
-            else:
-                val=sign*self._sublog(abs(x.float()), abs(y.float()))
-            return self.__class__({'pt':1, 'exp':0, 'mantissa':val})
+            la=abs(x.float())
+            lb=y._log10abs() if y.pt==0 else abs(y.float())
+            # _sublog(la, lb), inlined: this is the hot path.
+            val=sign*(la + math.log1p(-math.pow(10.0, lb-la))*self.invlogten)
+            return self._make(1, val)
         else:
             return self.__class__(x)
 
@@ -615,11 +779,12 @@ class Hypernum:
             return self.NaN
         # Ignore sign.  Re(log(x))=log(|x|)
         if self.pt==0:
-            rv = self.__class__(math.log10(abs(self.mantissa))+self.expon)
+            rv = self.__class__(self._log10abs())
             return rv
         else:
             rv=self.__class__(self)
             rv.mantissa=abs(rv.mantissa)
+            rv._sign=1
             rv.pt -= 1
             return rv
 
@@ -638,7 +803,7 @@ class Hypernum:
             if abs(self.float())<self.cutoff:
                 return self.__class__({'pt':0, 'exp':0,
                                        'mantissa':
-                                       pow(10, self.float())})
+                                       math.pow(10.0, self.float())})
         if self < 0:
             return self.Zero
         rv=self.__class__(self)
@@ -656,27 +821,28 @@ class Hypernum:
 
         x=self.float()
         if self.pt==0:
-            if abs(x) < self.logten/self.cutoff:
+            if abs(x) < self.logten_over_cutoff:
                 return self.__class__(math.exp(x))
-            if abs(x)/self.logten < self.overflow:
-                return self.__class__(dict(pt=1, mantissa=x/self.logten, exp=0))
+            if abs(x)*self.invlogten < self.overflow:
+                return self.__class__(dict(pt=1, mantissa=x*self.invlogten, exp=0))
             else:
                 # I don't think this can happen.
                 return self.__class__(dict(pt=2, exp=0,
-                                           mantissa=math.log10(x/self.logten)))
+                                           mantissa=math.log10(x*self.invlogten)))
         if x < 0:
             return self.Zero
 
         if self.pt == 1:
-            l1=x+math.log10(math.log10(math.exp(1)))
-            if l1 < self.logten/self.cutoff:
+            l1=x+self.log10log10e
+            if l1 < self.logten_over_cutoff:
                 return self.__class__(dict(pt=1, exp=0,
-                                           mantissa=math.log10(math.exp(1))*pow(10,x)))
+                                           mantissa=self.log10e*math.pow(10.0, x)))
             else:
                 return self.__class__(dict(pt=2, mantissa=l1, exp=0))
         else:
             rv=self.__class__(self)
             rv.mantissa=abs(rv.mantissa)
+            rv._sign=1
             rv.pt+=1
             return rv
 
@@ -700,27 +866,33 @@ class Hypernum:
                 return self.__class__(dict(pt=1, exp=0,
                                            mantissa=math.log10(l1)))
         if self.pt==2:
-            l1=x-math.log10(math.log10(math.exp(1)))
-            if l1 < self.logten/self.cutoff:
+            l1=x-self.log10log10e
+            if l1 < self.logten_over_cutoff:
                 return self.__class__(dict(pt=0, exp=0,
-                                           mantissa=pow(10,l1)))
+                                           mantissa=math.pow(10.0, l1)))
             else:
                 return self.__class__(dict(pt=1, exp=0, mantissa=l1))
         else:
             rv=self.__class__(self)
             rv.pt -= 1
             rv.mantissa=abs(rv.mantissa)
+            rv._sign=1
             return rv
 
     def iterpow(self, power):
         "Exponentiation by iterated multiplication"
-        # Iterative power: just repeated multiplication
+        # Exponentiation by squaring: O(log power) multiplications
+        # instead of power of them.
         if power == power-1:
             raise ValueError("Power too big")
+        power=int(power)          # avoid rounding problems.
         rv=self.One
+        base=self.__class__(self)
         while power>0:
-            rv = rv * self
-            power -= 1
+            if power & 1:
+                rv = rv * base
+            base = base * base
+            power >>= 1
         return rv
 
     def itertetra(self, power):
@@ -735,12 +907,19 @@ class Hypernum:
         while power>0:
             rv = self ** rv  # Order matters!
             power -= 1
+            # Once the tower is at PT 2 it swamps log10(self) in the
+            # multiplication, so each further step just adds a 10.
+            if power and rv.pt >= 2:
+                rv.pt += power
+                rv.normalize()
+                break
         return rv
 
     def __neg__(self):
         "x.__neg__() <==> -x"
         rv=self.__class__(self)
         rv.mantissa *= -1
+        rv._sign= -1 if rv.mantissa < 0 else 1 # Zero stays positive.
         return rv
 
     def __bool__(self):
@@ -805,41 +984,58 @@ class Hypernum:
 
     def __mul__(self, other):
         "x.__mul__(y) <==> x*y"
-        a, b = self._inorder(self, other)
+        if not isinstance(other, self.__class__):
+            other=self.__class__(other)
+        a, b = self._inorder_fast(self, other)
         if a.isnan() or b.isnan():
             return self.NaN
         if a.iszero() or b.iszero():
             return self.Zero
-        if a.sign() != b.sign():
+        if (a.mantissa < 0) != (b.mantissa < 0):
             sign = -1
         else:
             sign = 1
-        if b.isminf() or a.ispinf():
+        if a.isinf() or b.isinf():
             if sign > 0:
                 return self.Inf
             else:
                 return self.mInf
+        # The branches below want the bigger magnitude in a; with mixed
+        # signs _inorder_fast puts the positive one first instead.
+        if (b.pt, b.expon, abs(b.mantissa)) > (a.pt, a.expon, abs(a.mantissa)):
+            a, b = b, a
+        if a._swamping(b) is not None:
+            rv=self.__class__(a)
+            rv.mantissa=sign*abs(rv.mantissa)
+            rv._sign=sign
+            return rv
+        af=abs(a.float())
+        bf=abs(b.float())
         if a.pt==0:
-            rv=abs(a.float()) * abs(b.float())
+            rv=af * bf
             if rv>self.overflow:
-                return self.__class__({'pt':1, 'exp':0,
-                                       'mantissa':sign * (math.log10(abs(a.mantissa))+
-                                                          math.log10(abs(b.mantissa))+
-                                                          a.expon+b.expon)})
+                return self._make(1, sign * (a._log10abs()+
+                                                  b._log10abs()))
             return self.__class__(rv*sign)
         if a.pt==1 and b.pt==0:
-            rv=abs(a.float())+math.log10(abs(b.mantissa))+b.expon
-            return self.__class__({'pt':1, 'exp':0, 'mantissa':sign*rv})
+            rv=af+b._log10abs()
+            if rv < self.cutoff:
+                return self.__class__(sign*math.pow(10.0, rv))
+            return self._make(1, sign*rv)
         if a.pt==1 and b.pt==1:
-            rv=abs(a.float())+abs(b.float())
-            return self.__class__({'pt':1, 'exp':0, 'mantissa':sign*rv})
+            rv=af+bf
+            return self._make(1, sign*rv)
         if a.pt==2:
             if b.pt==2:
-                if abs(a.float())-abs(b.float()) < self.scale:
-                    return self.__class__({'pt':2, 'exp':0,
-                                           'mantissa':sign*self._addlog(abs(a.float()),
-                                                                        abs(b.float()))})
-        return self.__class__(a)
+                if af-bf < self.scale:
+                    # _addlog(af, bf), inlined.
+                    return self._make(2, sign*(af + math.log1p(math.pow(10.0, bf-af))*
+                                                  self.invlogten))
+        # a swamps b.
+        rv=self.__class__(a)
+        rv.mantissa=sign*abs(rv.mantissa)
+        rv._sign=sign
+        return rv
 
     def __truediv__(self, other):
         "x.__truediv__(y) <==> x/y"
@@ -847,9 +1043,7 @@ class Hypernum:
             other=self.__class__(other)
         if self.isnan() or other.isnan():
             return self.NaN
-        selfsign=self.sign()
-        othersign=other.sign()
-        rvsign=selfsign*othersign
+        rvsign=-1 if (self.mantissa < 0) != (other.mantissa < 0) else 1
         if other.iszero():
             return self.NaN     # or +-Inf?  Or raise exception?
         if self.isinf():
@@ -859,40 +1053,42 @@ class Hypernum:
                 return self.Inf
         if self.iszero():
             return self.Zero
+        sf=abs(self.float())
+        of=abs(other.float())
         if self.pt==0 and other.pt==0:
-            rv=abs(self.float()) / abs(other.float())
+            rv=sf / of
             if rv>self.overflow:
                 rv=self.log10()-other.log10()
                 rv.mantissa *= rvsign
+                rv._sign= -1 if rv.mantissa < 0 else 1
                 rv.pt=1
                 return rv
             else:
                 return self.__class__(rv*rvsign)
         if self.pt==1 and other.pt==0:
-            rv=abs(self.float())-abs(other.log10().float())
+            rv=sf-abs(other._log10abs())
             if rv > self.cutoff:
-                return self.__class__(dict(pt=1, exp=0, mantissa=rvsign*rv))
+                return self._make(1, rvsign*rv)
             else:
-                return self.__class__(dict(pt=0, exp=0,
-                                           mantissa=rvsign*pow(10, abs(rv))))
+                return self._make(0, rvsign*math.pow(10.0, abs(rv)))
         if self.pt==0 and other.pt==1:
-            rv=math.log10(abs(self.float())) - abs(other.float())
-            rv=self.__class__(pow(10,rv)*rvsign)
+            rv=self._log10abs() - of
+            rv=self.__class__(math.pow(10.0, rv)*rvsign)
             return rv
         if self.pt==1 and other.pt==1:
-            rv=abs(self.float())-abs(other.float())
+            rv=sf-of
             if rv < self.cutoff:
-                return self.__class__(rvsign*pow(10,rv))
+                return self.__class__(rvsign*math.pow(10.0, rv))
             else:
-                return self.__class__(dict(pt=1, exp=0, mantissa=rvsign*rv))
+                return self._make(1, rvsign*rv)
         if self.pt < other.pt:
             return self.Zero
         if self.pt > other.pt:
             return self.__class__(self)
         else:
-            if abs(self.float()) < abs(other.float()):
+            if sf < of:
                 return self.Zero
-            elif abs(self.float()) == abs(other.float()):
+            elif sf == of:
                 return self.One * rvsign
             else:
                 return self.__class__(self)
@@ -917,19 +1113,26 @@ class Hypernum:
     __xor__ = itertetra         # Abuse notation! Use ^ for tetration!
 
     def __rxor__(self, other):
-        if not isinstance(other, self.__class__):
+        if isinstance(other, int):
+            # Not "or": the interned zero is falsy.
+            interned=_SMALL_INTS.get(str(other))
+            other=self.__class__(other) if interned is None else interned
+        elif not isinstance(other, self.__class__):
             other=self.__class__(other)
         return other.itertetra(self)
 
     def __irshift__(self, other):
-        "x >>= k: increment the power-tower of x by k"
+        """x >>= k: increment the power-tower of x by k.
+
+        Rebinds x to a new Hypernum; the old one may be shared."""
         other = int(other)
         if self.pt + other >= 0:
-            self.pt += other
-            self.normalize()
+            rv=self.__class__(self)
+            rv.pt += other
+            rv.normalize()
         else:
             raise ValueError("PT would go negative")
-        return self
+        return rv
 
     def __ilshift__(self, other):
         "x <<= k: decrement the power-tower of x by k"
@@ -949,6 +1152,9 @@ class Hypernum:
     __rmod__=__mod__
 
 
+# Shared constants.  These are plain class attributes, built once here,
+# and methods hand them back directly (return self.Zero etc.), so
+# nothing should ever modify one in place.
 Hypernum.NaN=Hypernum('NaN')
 Hypernum.Inf=Hypernum('Inf')
 Hypernum.mInf=Hypernum('-Inf')
@@ -960,31 +1166,133 @@ Hypernum.Log10E=Hypernum(math.log10(math.exp(1)))
 Hypernum.Ln10=Hypernum(math.log(10)) # need both?
 Hypernum.Overflow=Hypernum(Hypernum.overflow)
 
+# A whole token that is a Hypernum literal.
+_HYPRE_FULL=re.compile(Hypernum.hypre+r"\Z", getattr(re, 'ASCII', 0))
+
+# Small integers, keyed by their literal spelling.  Shared like the
+# constants above.
+_SMALL_INTS={str(i):Hypernum(str(i)) for i in range(-16, 257)}
+
+@lru_cache(maxsize=1024)
+def _parse_literal(s):
+    "Hypernum(s), shared between calls for the same s: don't mutate it."
+    cached=_SMALL_INTS.get(s)
+    if cached is not None:
+        return cached
+    return Hypernum(s)
+
 if __name__=='__main__':
+    # The REPLs' tables, built once here rather than per line or token.
+
+    # Infix precedences.  Odd numbers are left-associative.  It makes sense.
+    OPERATORS={"+":11, "-":11, "*":21, "/":21, "**":30, "^":30, "***":30,
+               " BOT ":0, " END ":2, "(":3, ")":4, "ln":50, "exp":50,
+               "sqrt":50, "log10":50, "exp10":50, "gamma":50,
+               "factorial":50}
+    # Operator tokens to the functions they apply, for both REPLs.
+    BINOPS={"+":operator.add, "-":operator.sub, "*":operator.mul,
+            "/":operator.truediv, "**":operator.pow, "^":operator.pow,
+            "***":Hypernum.itertetra}
+    # Allowing sign permits non-Hypernums in stack!
+    UNOPS={name:getattr(Hypernum, name)
+           for name in ("ln", "exp", "sqrt", "log10", "sign", "factorial",
+                        "gamma")}
+    UNOPS["exp10"]=Hypernum.pow10
+
+    # Infix tokens.  Longest operators first; anything else is a
+    # one-character token that will fail to parse as a number.
+    TOKEN_RE=re.compile(r"\*\*\*|\*\*|\^|[-+*/()]|ln|exp10|exp|sqrt|log10|"
+                        r"gamma|factorial|pi|e|%X|Inf|NaN|" + Hypernum.hypre +
+                        r"|\S", getattr(re, 'ASCII', 0))
+
+    # RPN tokens to handlers, which each take the stack and work on it in
+    # place.
+    def _binop(f):
+        "RPN handler applying f to the top two entries."
+        def handler(st):
+            y=st.pop()
+            x=st.pop()
+            st.append(f(x, y))
+        return handler
+
+    def _unop(f):
+        "RPN handler applying f to the top entry."
+        def handler(st):
+            st.append(f(st.pop()))
+        return handler
+
+    def _const(c):
+        "RPN handler pushing c."
+        def handler(st):
+            st.append(c)
+        return handler
+
+    def _dup(st):
+        st.append(st[-1])
+
+    def _drop(st):
+        st.pop()
+
+    def _swap(st):
+        y=st.pop()
+        x=st.pop()
+        st.append(y)
+        st.append(x)
+
+    def _clear(st):
+        del st[:]
+
+    def _print(st):
+        print(str(st[-1]))
+
+    def _struct(st):
+        print(st[-1]._struct()) # for debugging.
+
+    def _W(x):
+        # !!!!XXX only does float!
+        return Hypernum(Hypernum._lambertw(x.float()))
+
+    DISPATCH={op:_binop(f) for op, f in BINOPS.items()}
+    DISPATCH.update((op, _unop(f)) for op, f in UNOPS.items())
+    DISPATCH.update({"!":_unop(Hypernum.factorial),
+                     "fact":_unop(Hypernum.factorial),
+                     "exp10":_unop(lambda x: pow(10, x)), # common antilog
+                     "W":_unop(_W),
+                     "e":_const(Hypernum.E), "pi":_const(Hypernum.Pi),
+                     "inf":_const(Hypernum.Inf), "minf":_const(Hypernum.mInf),
+                     "nan":_const(Hypernum.NaN),
+                     "dup":_dup, "drop":_drop, "swap":_swap, "clear":_clear,
+                     "p":_print, "_struct":_struct})
+
     try:
         import readline
     except ImportError:
         pass
 
     def doInfix():
-        operators={"+":11, "-":11, "*":21, "/":21, "**":30, "^":30, "***":30,
-                   " BOT ":0, " END ":2, "(":3, ")":4, "ln":50, "exp":50,
-                   "sqrt":50, "log10":50, "exp10":50, "gamma":50,
-                   "factorial":50}
-        # Odd numbers are left-associative.  It makes sense.
         lastx=Hypernum.Zero
         while True:
             try:
                 opstack=[" BOT "]    # Restart each line.
+                precstack=[0]        # OPERATORS[] of each opstack entry
                 numstack=[]
-                # Tokenize somehow?  Split on spaces for now.
-                instr=input("-> ").strip()
-                tokens=instr.split()
+                instr=input("-> ").strip().replace(Hypernum.exp_ten, 'e')
+                tokens=[]
+                for m in TOKEN_RE.finditer(instr):
+                    tok=m.group(0)
+                    # A sign where an operand is expected belongs to the
+                    # number after it.
+                    if (tokens and tokens[-1] in ("+", "-") and
+                        (tok[0].isdigit() or tok == 'Inf') and
+                        (len(tokens) == 1 or
+                         (tokens[-2] in OPERATORS and tokens[-2] != ")"))):
+                        tok=tokens.pop()+tok
+                    tokens.append(tok)
                 tokens.append(' END ')
                 for tok in tokens:
-                    if tok in operators:
-                        topprec=operators[opstack[-1]]
-                        thisprec=operators[tok]
+                    if tok in OPERATORS:
+                        topprec=precstack[-1]
+                        thisprec=stackprec=OPERATORS[tok]
                         # Special-case left-paren: it's high-prec from one
                         # side (always pushes) and low-prec from the other
                         # (nothing executes it except right-paren)
@@ -993,36 +1301,25 @@ if __name__=='__main__':
                         while (thisprec < topprec or
                                (thisprec==topprec and thisprec & 1)):
                             op=opstack.pop()
-                            topprec=operators[opstack[-1]]
-                            if op in ["+", "-", "*", "/", "**"]:
-                                y=numstack.pop()
-                                x=numstack.pop()
-                                res=eval("x"+op+"y")
-                                numstack.append(res)
-                            elif op=='^':
-                                y=numstack.pop()
-                                x=numstack.pop()
-                                res=x**y
-                                numstack.append(res)
-                            elif op=='***':
+                            precstack.pop()
+                            topprec=precstack[-1]
+                            if op in BINOPS:
                                 y=numstack.pop()
                                 x=numstack.pop()
-                                res=x.itertetra(y)
-                                numstack.append(res)
+                                numstack.append(BINOPS[op](x, y))
                             elif op=="(":
                                 if tok==")":
                                     break
-                            elif op in ["ln", "exp", "sqrt", "log10", "exp10",
-                                        "factorial", "gamma"]:
+                            elif op in UNOPS:
                                 x=numstack.pop()
-                                res=eval("x."+op+"()")
-                                numstack.append(res)
+                                numstack.append(UNOPS[op](x))
                             elif op == " BOT " or tok == " END ":
                                 pass
                             else:
                                 raise SyntaxError(tok)
                         if tok != ")":
                             opstack.append(tok)
+                            precstack.append(stackprec)
                     elif tok == '%X':
                         numstack.append(lastx)
                     elif tok == 'e':
@@ -1031,7 +1328,7 @@ if __name__=='__main__':
                         numstack.append(Hypernum.Pi)
                     else:
                         try:
-                            numstack.append(Hypernum(tok))
+                            numstack.append(_parse_literal(tok))
                         except AssertionError:
                             raise SyntaxError(tok)
                 if len(numstack) != 1:
@@ -1051,94 +1348,27 @@ if __name__=='__main__':
         # RPN is easier to code and easier to debug.
         print("RPN Mode")
         stack=[]
+        push=stack.append
+        # id -> (entry, repr(entry)) for the entries last shown; holding
+        # the entry keeps its id from being reused.
+        shown={}
         while True:
             try:
+                window=stack if len(stack)<8 else stack[-7:]
+                shown={id(x):shown.get(id(x)) or (x, repr(x)) for x in window}
+                rendered="["+", ".join(shown[id(x)][1] for x in window)+"]"
                 if len(stack)<8:
-                    print(str(stack))
+                    print(rendered)
                 else:
-                    print("({})... ".format(len(stack)-7)+str(stack[-7:]))
+                    print("({})... ".format(len(stack)-7)+rendered)
                 instr=input("-> ").strip()
                 for s in instr.split():
-                    if s=="+":
-                        y = stack.pop()
-                        x = stack.pop()
-                        stack.append(x+y)
-                    elif s=="-":
-                        y = stack.pop()
-                        x = stack.pop()
-                        stack.append(x-y)
-                    elif s=="*":
-                        y = stack.pop()
-                        x = stack.pop()
-                        stack.append(x*y)
-                    elif s=="/":
-                        y = stack.pop()
-                        x = stack.pop()
-                        stack.append(x/y)
-                    elif s=="**" or s=="^":
-                        y = stack.pop()
-                        x = stack.pop()
-                        stack.append(x**y)
-                    elif s=="***":
-                        y = stack.pop()
-                        x = stack.pop()
-                        stack.append(x.itertetra(y))
-                    elif s=="dup":
-                        stack.append(stack[-1])
-                    elif s=="drop":
-                        stack.pop()
-                    elif s=="!" or s=="fact":
-                        x=stack.pop()
-                        stack.append(x.factorial())
-                    elif s=='exp10': # common antilog
-                        x=stack.pop()
-                        stack.append(pow(10, x))
-                    # elif s=="exp":
-                    #     x=stack.pop()
-                    #     stack.append(x.exp())
-                    # elif s=="ln":
-                    #     x=stack.pop()
-                    #     stack.append(x.ln())
-                    # elif s=="log10":
-                    #     x=stack.pop()
-                    #     stack.append(x.log10())
-                    # elif s=="sqrt":
-                    #     x=stack.pop()
-                    #     stack.append(x.sqrt())
-                    # Can/should I do this?  Guess so.
-                    # Allowing sign permits non-Hypernums in stack!
-                    elif s in ["exp", "ln", "log10", "sqrt", "sign",
-                               "factorial", "gamma"]:
-                        x=stack.pop()
-                        stack.append(eval("x."+s+"()"))
-                    elif s=="W":
-                        x=stack.pop()
-                        # !!!!XXX only does float!
-                        stack.append(Hypernum(Hypernum._lambertw(x.float())))
-                    elif s=="e":
-                        stack.append(Hypernum.E)
-                    elif s=="pi":
-                        stack.append(Hypernum.Pi)
-                    elif s=="inf":
-                        stack.append(Hypernum.Inf)
-                    elif s=="minf":
-                        stack.append(Hypernum.mInf)
-                    elif s=="nan":
-                        stack.append(Hypernum.NaN)
-                    elif s=="_struct":
-                        print(stack[-1]._struct()) # for debugging.
-                    elif s=="p":
-                        print(str(stack[-1]))
-                    elif s=="clear":
-                        stack=[]
-                    elif s=="swap":
-                        y = stack.pop()
-                        x = stack.pop()
-                        stack.append(y)
-                        stack.append(x)
-                    # At the end; matches too much.
-                    elif re.match(Hypernum.hypre+r"$", s):
-                        stack.append(Hypernum(s))
+                    handler=DISPATCH.get(s)
+                    if handler:
+                        handler(stack)
+                    # Only if nothing else matched; matches too much.
+                    elif _HYPRE_FULL.match(s.replace(Hypernum.exp_ten, 'e')):
+                        push(_parse_literal(s))
                     else:
                         print("Unknown token: "+s)
             except IndexError:
@@ -1146,7 +1376,6 @@ if __name__=='__main__':
             except ValueError as e:
                 print("ValueError: "+str(e))
 
-    import sys
     try:
         if sys.argv and len(sys.argv)>1 and sys.argv[1]=='-R':
             doRPN()